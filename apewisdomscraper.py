@@ -1,156 +1,197 @@
 import dearpygui.dearpygui as dpg
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from selectolax.parser import HTMLParser
 import time
+import threading
+import queue
+from operator import itemgetter
+from diskcache import Cache
 import yfinance as yf
-import plotly.graph_objects as go
 import numpy as np
-from PIL import Image
-import io
 from datetime import timedelta
-import pytz  # Add this import at the top
 
 # Initialize global variables
 ticker_data = {}
+ticker_errors = set()  # Tickers whose price data could not be fetched
 last_update_time = "Never"
 current_sort = {'field': 'mentions', 'reverse': True}  # Default sort by mentions descending
+displayed_tickers = []  # Tickers that currently have a row in the UI, in display order
+sorted_cache = None  # Result of sorted_ticker_data until the data or sort settings change
+plotted_keys = {}  # Ticker -> fingerprint of the price series currently shown in its plot
+update_thread = None
+update_results = queue.Queue()  # Finished fetches handed from the worker thread to the UI loop
 
-def create_plot(prices, timestamps, ticker):
-    """Creates a Plotly figure"""
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(
-        x=timestamps,
-        y=prices,
-        mode='lines',
-        name=ticker,
-        line=dict(width=1)
-    ))
-    
-    fig.update_layout(
-        height=300,
-        width=500,
-        margin=dict(l=0, r=0, t=0, b=0),
-        paper_bgcolor='rgba(0,0,0,0)',
-        plot_bgcolor='rgba(0,0,0,0)',
-        yaxis=dict(
-            showgrid=True,
-            gridcolor='rgba(128,128,128,0.2)',
-        ),
-        xaxis=dict(
-            showgrid=True,
-            gridcolor='rgba(128,128,128,0.2)',
-            type='date',
-            tickformat='%H:%M\n%m/%d'
-        ),
-        showlegend=False
-    )
-    return fig
+# Shared HTTP session so ApeWisdom and yfinance requests reuse pooled connections
+SESSION = requests.Session()
+SESSION.headers.update({
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+})
+SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=16))
 
-def fig_to_rgba_array(fig):
-    """Converts a plotly figure to an RGBA array for DPG texture"""
-    img_bytes = fig.to_image(format="png")
-    img = Image.open(io.BytesIO(img_bytes))
-    img_array = np.array(img)
-    if img_array.shape[2] == 3:
-        alpha = np.full((*img_array.shape[:2], 1), 255, dtype=np.uint8)
-        img_array = np.concatenate([img_array, alpha], axis=2)
-    return img_array.flatten().tolist()
+# On-disk cache so rapid manual updates and restarts don't re-hit the network.
+# TTLs follow the data cadence: 15m price bars vs. the faster-moving ApeWisdom list.
+_CACHE = Cache('.cache')
+STOCK_CACHE_TTL = 300
+APEWISDOM_CACHE_TTL = 60
 
-def fetch_stock_data(ticker):
-    """Fetches detailed stock data using yfinance"""
+def fetch_stock_data(tickers):
+    """Fetches detailed stock data for all tickers in one batched yfinance download"""
+    results = {}
+    missing = []
+    for ticker in tickers:
+        cached = _CACHE.get(('stock', ticker.replace('$', ''), '5d', '15m'))
+        if cached is not None:
+            results[ticker] = cached
+        else:
+            missing.append(ticker)
+    if not missing:
+        return results
+    
+    clean_tickers = [ticker.replace('$', '') for ticker in missing]
     try:
-        clean_ticker = ticker.replace('$', '')
-        stock = yf.Ticker(clean_ticker)
-        hist = stock.history(period="5d", interval="15m")
-        if len(hist) > 0:
-            return hist['Close'].tolist(), hist.index.tolist()
-        return None, None
+        df = yf.download(clean_tickers, period="5d", interval="15m", group_by='ticker',
+                         threads=True, session=SESSION, progress=False)
     except Exception as e:
-        print(f"Error fetching stock data for {clean_ticker}: {e}")
-        return None, None
+        print(f"Error fetching stock data for {', '.join(clean_tickers)}: {e}")
+        return results
+    
+    for ticker, clean_ticker in zip(missing, clean_tickers):
+        try:
+            # A single-ticker download comes back without the per-ticker column level
+            hist = df[clean_ticker] if df.columns.nlevels > 1 else df
+            close = hist['Close'].dropna()
+        except KeyError:
+            continue
+        if len(close) > 0:
+            # DPG's time axis labels in UTC, so drop the tz to keep exchange wall-clock
+            # times (e.g. 09:30-16:00 ET) as the Plotly chart showed them
+            index = close.index
+            if index.tz is not None:
+                index = index.tz_localize(None)
+            # float64 closes and epoch-second timestamps, kept as arrays for the plot
+            result = (close.to_numpy(dtype=np.float64), index.asi8 / 1e9)
+            _CACHE.set(('stock', clean_ticker, '5d', '15m'), result, expire=STOCK_CACHE_TTL)
+            results[ticker] = result
+    return results
 
 def fetch_apewisdom_data():
     """Scrapes top 10 tickers from ApeWisdom.io"""
     url = "https://apewisdom.io/"
+    cached = _CACHE.get(('apewisdom', url))
+    if cached is not None:
+        return cached
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=10)
+        response = SESSION.get(url, timeout=10)
         response.raise_for_status()
         
-        soup = BeautifulSoup(response.text, 'html.parser')
-        raw_data = [div.text.strip() for div in soup.find_all("td", class_="td-right")[:30]]
-        
-        sentiments = []
-        for span in soup.find_all("span", class_=["percentage-green", "percentage-red"]):
-            try:
-                sentiment = float(span.text.strip().rstrip('%'))
-                sentiments.append(sentiment)
-            except ValueError:
-                sentiments.append(0.0)
-        
+        # Read each table row on its own so mentions and sentiment can't drift between tickers
         ticker_data = []
-        sentiment_idx = 0
-        for i in range(0, len(raw_data), 3):
-            if i + 2 < len(raw_data):
-                ticker = raw_data[i + 1]
-                mentions = raw_data[i + 2]
-                
-                if ticker.isdigit():
-                    continue
-                
-                sentiment = sentiments[sentiment_idx] if sentiment_idx < len(sentiments) else 0.0
-                sentiment_idx += 1
-                
-                ticker_data.append({
-                    'ticker': ticker,
-                    'mentions': mentions,
-                    'sentiment_change': sentiment
-                })
+        for row in HTMLParser(response.text).css("tr"):
+            cells = row.css("td.td-right")
+            if len(cells) < 3:
+                continue
+            ticker = cells[1].text(strip=True)
+            mentions = cells[2].text(strip=True)
+            
+            if ticker.isdigit():
+                continue
+            
+            span = row.css_first("span.percentage-green, span.percentage-red")
+            sentiment = parse_percentage(span.text(strip=True)) if span is not None else 0.0
+            
+            ticker_data.append({
+                'ticker': ticker,
+                'mentions': mentions,
+                'sentiment_change': sentiment
+            })
+            if len(ticker_data) == 10:
+                break
         
-        return ticker_data[:10]
+        if ticker_data:
+            _CACHE.set(('apewisdom', url), ticker_data, expire=APEWISDOM_CACHE_TTL)
+        return ticker_data
         
     except Exception as e:
         print(f"Error fetching ApeWisdom data: {e}")
         return None
 
+def parse_percentage(text):
+    """Converts an ApeWisdom percentage such as "+12.5%" to a float"""
+    try:
+        return float(text.rstrip('%'))
+    except ValueError:
+        return 0.0
+
+def parse_mentions(mentions):
+    """Converts an ApeWisdom mention count such as "1,234" to a float"""
+    try:
+        return float(str(mentions).replace(',', ''))
+    except ValueError:
+        return 0.0
+
 def update_data():
-    """Fetches and updates ticker data."""
-    global ticker_data, last_update_time
+    """Starts fetching ticker data in the background so the UI keeps rendering."""
+    global update_thread
+    if update_thread is not None and update_thread.is_alive():
+        return  # An update is already in progress
     dpg.configure_item("loading_wheel", show=True)
-    
+    update_thread = threading.Thread(target=_update_data_worker, daemon=True)
+    update_thread.start()
+
+def _update_data_worker():
+    """Fetches ticker data off the UI thread and queues the result for apply_update_results"""
     ape_data = fetch_apewisdom_data()
     if not ape_data:
-        dpg.set_value("status_text", "Error fetching tickers from ApeWisdom!")
-        dpg.configure_item("loading_wheel", show=False)
+        update_results.put(None)
         return
     
-    ticker_data.clear()
+    new_data = {}
+    new_errors = set()
+    stock_data = fetch_stock_data([item['ticker'] for item in ape_data])
     
     for item in ape_data:
         ticker = item['ticker']
-        prices, timestamps = fetch_stock_data(ticker)
+        prices, timestamps = stock_data.get(ticker, (None, None))
         
-        if prices and timestamps:
-            current_price = prices[-1]
-            prev_price = prices[0]
-            price_change = ((current_price - prev_price) / prev_price) * 100
+        if prices is not None:
+            price_change = (prices[-1] - prices[0]) / prices[0] * 100.0
             
-            ticker_data[ticker] = {
+            new_data[ticker] = {
                 'prices': prices,
                 'timestamps': timestamps,
                 'price_change': price_change,
                 'sentiment_change': item['sentiment_change'],
-                'mentions': item['mentions']
+                'mentions': item['mentions'],
+                'mentions_num': parse_mentions(item['mentions'])
             }
         else:
             print(f"Error fetching data for {ticker}")
-            ticker_data[ticker] = "Error fetching data"
+            new_errors.add(ticker)
     
-    last_update_time = time.time()
-    refresh_ui()
-    dpg.configure_item("loading_wheel", show=False)
+    update_results.put((new_data, new_errors))
+
+def apply_update_results():
+    """Applies finished background updates; must be called from the UI thread"""
+    global last_update_time, sorted_cache
+    while True:
+        try:
+            result = update_results.get_nowait()
+        except queue.Empty:
+            return
+        
+        if result is None:
+            dpg.set_value("status_text", "Error fetching tickers from ApeWisdom!")
+        else:
+            new_data, new_errors = result
+            ticker_data.clear()
+            ticker_data.update(new_data)
+            ticker_errors.clear()
+            ticker_errors.update(new_errors)
+            sorted_cache = None
+            last_update_time = time.time()
+            refresh_ui()
+        dpg.configure_item("loading_wheel", show=False)
 
 def get_time_since_update():
     """Returns time since last update in minutes and seconds"""
@@ -161,18 +202,16 @@ def get_time_since_update():
     seconds = int(elapsed % 60)
     return f"{minutes}m {seconds}s ago"
 
-def get_color_from_percentage(percentage):
-    """Returns RGB color based on percentage change"""
-    if percentage > 0:
-        intensity = min(abs(percentage) / 20.0, 1.0)
-        return [0, intensity, 0]
-    else:
-        intensity = min(abs(percentage) / 20.0, 1.0)
-        return [intensity, 0, 0]
+def get_colors_from_percentages(percentages):
+    """Returns an (N, 3) array of RGB colors, green for gains and red for losses"""
+    percentages = np.asarray(percentages, dtype=np.float64)
+    intensities = np.minimum(np.abs(percentages) / 20.0, 1.0)
+    return np.where(percentages[:, None] > 0, [0, 1, 0], [1, 0, 0]) * intensities[:, None]
 
 def sort_tickers(field):
-    """Updates the sort settings and refreshes the UI"""
-    global current_sort
+    """Updates the sort settings and reorders the existing ticker rows"""
+    global current_sort, sorted_cache
+    sorted_cache = None
     if current_sort['field'] == field:
         # If clicking same field, toggle direction
         current_sort['reverse'] = not current_sort['reverse']
@@ -180,73 +219,103 @@ def sort_tickers(field):
         # New field, default to descending
         current_sort['field'] = field
         current_sort['reverse'] = True
-    refresh_ui()
+    # Data is unchanged, so labels, colors and plots are left alone; only the order moves.
+    # Runs on the main loop thread (see create_ui), so rows can't be deleted underneath it.
+    try:
+        reorder_rows([ticker for ticker, _ in sorted_ticker_data() if ticker in displayed_tickers])
+    except Exception as e:
+        print(f"Error sorting tickers: {e}")
+        dpg.set_value("status_text", "Error updating display!")
 
 def sorted_ticker_data():
     """Returns ticker data sorted according to current settings"""
-    def get_sort_key(item):
-        ticker, data = item
-        if isinstance(data, str):
-            return -float('inf')  # Put errors at the end
-        try:
-            if current_sort['field'] == 'mentions':
-                return float(str(data['mentions']).replace(',', ''))
-            return float(data[current_sort['field']])
-        except (ValueError, KeyError):
-            return -float('inf')
+    global sorted_cache
+    if sorted_cache is not None:
+        return sorted_cache
     
-    items = list(ticker_data.items())
-    return sorted(items, key=get_sort_key, reverse=current_sort['reverse'])
+    # Sort on numeric fields precomputed in update_data
+    field = 'mentions_num' if current_sort['field'] == 'mentions' else current_sort['field']
+    get_field = itemgetter(field)
+    sorted_cache = sorted(ticker_data.items(), key=lambda item: get_field(item[1]),
+                          reverse=current_sort['reverse'])
+    return sorted_cache
+
+def get_plot_key(prices, timestamps):
+    """Cheap fingerprint of a price series: its length, last bar time and last few closes"""
+    return len(prices), timestamps[-1], prices[-5:].tobytes()
+
+def create_ticker_row(ticker):
+    """Creates the widgets for a ticker once; later refreshes update them in place"""
+    with dpg.tree_node(tag=f"row_{ticker}", parent="ticker_list", before="error_rows", default_open=False):
+        dpg.add_text(tag=f"price_text_{ticker}")
+        dpg.add_text(tag=f"sentiment_text_{ticker}")
+        with dpg.plot(height=300, width=500, use_24hour_clock=True):
+            dpg.add_plot_axis(dpg.mvXAxis, time=True, tag=f"xaxis_{ticker}")
+            with dpg.plot_axis(dpg.mvYAxis, tag=f"yaxis_{ticker}"):
+                dpg.add_line_series([], [], label=ticker, tag=f"series_{ticker}")
+
+def reorder_rows(tickers):
+    """Moves existing ticker rows into the given order; a no-op when the order is unchanged"""
+    if tickers == displayed_tickers:
+        return
+    # Walk backwards so each row can be placed directly before its successor;
+    # the last one goes just above the error rows
+    next_row = "error_rows"
+    for ticker in reversed(tickers):
+        row = f"row_{ticker}"
+        dpg.move_item(row, parent="ticker_list", before=next_row)
+        next_row = row
+    displayed_tickers[:] = tickers
 
 def refresh_ui():
     """Updates the UI with current ticker data"""
     try:
-        children = dpg.get_item_children("ticker_list")
-        if children and len(children) > 1:
-            for child in children[1]:
-                dpg.delete_item(child)
+        if dpg.does_item_exist("loading_text"):
+            dpg.delete_item("loading_text")
+        
+        rows = sorted_ticker_data()
+        
+        # Drop rows for tickers that fell out of the list or failed to fetch
+        shown = {ticker for ticker, _ in rows}
+        for ticker in displayed_tickers:
+            if ticker not in shown:
+                dpg.delete_item(f"row_{ticker}")
+                plotted_keys.pop(ticker, None)
+        displayed_tickers[:] = [ticker for ticker in displayed_tickers if ticker in shown]
         
-        # Add sorting buttons at the top
-        with dpg.group(horizontal=True, parent="ticker_list"):
-            dpg.add_button(label="Sort by Mentions", callback=lambda: sort_tickers('mentions'))
-            dpg.add_button(label="Sort by Price Change", callback=lambda: sort_tickers('price_change'))
-            dpg.add_button(label="Sort by Sentiment", callback=lambda: sort_tickers('sentiment_change'))
-        dpg.add_separator(parent="ticker_list")
+        # Colors for every row in one vectorized pass
+        price_colors = get_colors_from_percentages([data['price_change'] for _, data in rows])
+        sentiment_colors = get_colors_from_percentages([data['sentiment_change'] for _, data in rows])
         
         # Display sorted tickers
-        for ticker, data in sorted_ticker_data():
-            if isinstance(data, str) and data == "Error fetching data":
-                continue
-                
-            texture_id = f"texture_{ticker}"
+        for i, (ticker, data) in enumerate(rows):
+            if not dpg.does_item_exist(f"row_{ticker}"):
+                create_ticker_row(ticker)
+                displayed_tickers.append(ticker)
             
-            with dpg.tree_node(label=f"{ticker} - Mentions: {data['mentions']}", 
-                             parent="ticker_list",
-                             default_open=False):
-                
-                dpg.add_text(f"Price Change: {data['price_change']:.2f}%", 
-                           color=get_color_from_percentage(data['price_change']))
-                dpg.add_text(f"Sentiment Change: {data['sentiment_change']:.2f}%",
-                           color=get_color_from_percentage(data['sentiment_change']))
-                
+            dpg.configure_item(f"row_{ticker}", label=f"{ticker} - Mentions: {data['mentions']}")
+            dpg.set_value(f"price_text_{ticker}", f"Price Change: {data['price_change']:.2f}%")
+            dpg.configure_item(f"price_text_{ticker}", color=price_colors[i].tolist())
+            dpg.set_value(f"sentiment_text_{ticker}", f"Sentiment Change: {data['sentiment_change']:.2f}%")
+            dpg.configure_item(f"sentiment_text_{ticker}", color=sentiment_colors[i].tolist())
+            
+            # Skip the plot upload when the series is the same as the one already shown
+            plot_key = get_plot_key(data['prices'], data['timestamps'])
+            if plotted_keys.get(ticker) != plot_key:
                 try:
-                    fig = create_plot(data['prices'], data['timestamps'], ticker)
-                    img_data = fig_to_rgba_array(fig)
-                    
-                    with dpg.texture_registry():
-                        if dpg.does_item_exist(texture_id):
-                            dpg.delete_item(texture_id)
-                            
-                        dpg.add_static_texture(
-                            width=500,
-                            height=300,
-                            default_value=img_data,
-                            tag=texture_id
-                        )
-                    dpg.add_image(texture_id)
+                    dpg.set_value(f"series_{ticker}", [data['timestamps'], data['prices']])
+                    dpg.fit_axis_data(f"xaxis_{ticker}")
+                    dpg.fit_axis_data(f"yaxis_{ticker}")
+                    plotted_keys[ticker] = plot_key
                 except Exception as e:
-                    print(f"Error creating plot for {ticker}: {e}")
-                    dpg.add_text("Error: Could not create plot")
+                    print(f"Error updating plot for {ticker}: {e}")
+        
+        reorder_rows([ticker for ticker, _ in rows])
+        
+        # Tickers whose price data failed get a plain error row at the end of the list
+        dpg.delete_item("error_rows", children_only=True)
+        for ticker in sorted(ticker_errors):
+            dpg.add_text(f"{ticker} - Error fetching data", parent="error_rows")
                 
     except Exception as e:
         print(f"Error refreshing UI: {e}")
@@ -275,7 +344,18 @@ def create_ui():
             dpg.add_loading_indicator(tag="loading_wheel", show=False, radius=2)
         
         with dpg.child_window(height=500, tag="ticker_list", autosize_x=True):
-            dpg.add_text("Loading data...")
+            # Sorting buttons at the top
+            with dpg.group(horizontal=True):
+                dpg.add_button(label="Sort by Mentions", callback=lambda: sort_tickers('mentions'))
+                dpg.add_button(label="Sort by Price Change", callback=lambda: sort_tickers('price_change'))
+                dpg.add_button(label="Sort by Sentiment", callback=lambda: sort_tickers('sentiment_change'))
+            dpg.add_separator()
+            dpg.add_text("Loading data...", tag="loading_text")
+            dpg.add_group(tag="error_rows")
+    
+    # Run item callbacks from the main loop instead of DPG's callback thread, so sorting,
+    # manual updates and apply_update_results never touch the ticker globals concurrently
+    dpg.configure_app(manual_callback_management=True)
     
     # Configure and show the viewport
     dpg.create_viewport(title='Stock Sentiment Tracker', width=820, height=620)
@@ -286,9 +366,16 @@ def create_ui():
     update_data()
     
     # Start the main loop
+    last_status_second = -1
     while dpg.is_dearpygui_running():
-        # Update the "last update" text
-        dpg.set_value("status_text", f"Last update: {get_time_since_update()}")
+        dpg.run_callbacks(dpg.get_callback_queue())
+        apply_update_results()
+        
+        # Update the "last update" text at most once per second; it only has second precision
+        now = int(time.time())
+        if now != last_status_second and last_update_time != "Never":
+            dpg.set_value("status_text", f"Last update: {get_time_since_update()}")
+            last_status_second = now
         dpg.render_dearpygui_frame()
     
     dpg.destroy_context()